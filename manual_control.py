@@ -80,69 +80,46 @@ except IndexError:
 # ==============================================================================
 
 
-import carla
-
-from carla import ColorConverter as cc
-
 import argparse
-import collections
-import datetime
 import logging
-import math
-import random
 import re
-import weakref
-from pygame import mixer
+from collections import defaultdict, deque
+from datetime import timedelta
+from functools import lru_cache, partial
+from math import degrees, hypot
+from random import choice
+from weakref import ref as weakref
 
 try:
     import pygame
-    from pygame.locals import KMOD_CTRL
-    from pygame.locals import KMOD_SHIFT
-    from pygame.locals import K_0
-    from pygame.locals import K_9
-    from pygame.locals import K_BACKQUOTE
-    from pygame.locals import K_BACKSPACE
-    from pygame.locals import K_COMMA
-    from pygame.locals import K_DOWN
-    from pygame.locals import K_ESCAPE
-    from pygame.locals import K_F1
-    from pygame.locals import K_LEFT
-    from pygame.locals import K_PERIOD
-    from pygame.locals import K_RIGHT
-    from pygame.locals import K_SLASH
-    from pygame.locals import K_SPACE
-    from pygame.locals import K_TAB
-    from pygame.locals import K_UP
-    from pygame.locals import K_a
-    from pygame.locals import K_b
-    from pygame.locals import K_c
-    from pygame.locals import K_d
-    from pygame.locals import K_g
-    from pygame.locals import K_h
-    from pygame.locals import K_i
-    from pygame.locals import K_l
-    from pygame.locals import K_m
-    from pygame.locals import K_n
-    from pygame.locals import K_o
-    from pygame.locals import K_p
-    from pygame.locals import K_q
-    from pygame.locals import K_r
-    from pygame.locals import K_s
-    from pygame.locals import K_t
-    from pygame.locals import K_v
-    from pygame.locals import K_w
-    from pygame.locals import K_x
-    from pygame.locals import K_z
-    from pygame.locals import K_u
-    from pygame.locals import K_MINUS
-    from pygame.locals import K_EQUALS
+    from pygame.locals import (
+        KMOD_CTRL, KMOD_SHIFT,
+        K_0, K_9, K_BACKQUOTE, K_BACKSPACE, K_COMMA, K_DOWN, K_ESCAPE, K_F1,
+        K_LEFT, K_PERIOD, K_RIGHT, K_SLASH, K_SPACE, K_TAB, K_UP,
+        K_a, K_b, K_c, K_d, K_g, K_h, K_i, K_l, K_m, K_n, K_o, K_p, K_q, K_r,
+        K_s, K_t, K_v, K_w, K_x, K_z, K_u, K_MINUS, K_EQUALS)
 except ImportError:
     raise RuntimeError('cannot import pygame, make sure pygame package is installed')
 
-try:
-    import numpy as np
-except ImportError:
-    raise RuntimeError('cannot import numpy, make sure numpy package is installed')
+# The carla egg and numpy are heavy to load, they are only imported once the
+# arguments have been parsed (see _lazy_imports) so that e.g. --help returns
+# immediately.
+carla = None
+cc = None
+np = None
+
+
+def _lazy_imports():
+    global carla, cc, np, _DVS_EVENT_DTYPE
+    if carla is None:
+        import carla
+        from carla import ColorConverter as cc
+    if np is None:
+        try:
+            import numpy as np
+        except ImportError:
+            raise RuntimeError('cannot import numpy, make sure numpy package is installed')
+        _DVS_EVENT_DTYPE = np.dtype([('x', np.uint16), ('y', np.uint16), ('t', np.int64), ('pol', np.bool_)])
 
 
 # ==============================================================================
@@ -150,16 +127,29 @@ except ImportError:
 # ==============================================================================
 
 
+_WEATHER_NAME_RGX = re.compile('.+?(?:(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])|$)')
+_WEATHER_PRESET_RGX = re.compile('[A-Z].+')
+_WEATHER_PRESETS = None
+
+
 def find_weather_presets():
-    rgx = re.compile('.+?(?:(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])|$)')
-    name = lambda x: ' '.join(m.group(0) for m in rgx.finditer(x))
-    presets = [x for x in dir(carla.WeatherParameters) if re.match('[A-Z].+', x)]
-    return [(getattr(carla.WeatherParameters, x), name(x)) for x in presets]
+    # The presets only depend on the carla module, build them once.
+    global _WEATHER_PRESETS
+    if _WEATHER_PRESETS is None:
+        name = lambda x: ' '.join(m.group(0) for m in _WEATHER_NAME_RGX.finditer(x))
+        presets = [x for x in dir(carla.WeatherParameters) if _WEATHER_PRESET_RGX.match(x)]
+        _WEATHER_PRESETS = [(getattr(carla.WeatherParameters, x), name(x)) for x in presets]
+    return _WEATHER_PRESETS
+
+
+@lru_cache(maxsize=256)
+def _display_name(type_id, truncate):
+    name = ' '.join(type_id.replace('_', '.').title().split('.')[1:])
+    return (name[:truncate - 1] + u'\u2026') if len(name) > truncate else name
 
 
 def get_actor_display_name(actor, truncate=250):
-    name = ' '.join(actor.type_id.replace('_', '.').title().split('.')[1:])
-    return (name[:truncate - 1] + u'\u2026') if len(name) > truncate else name
+    return _display_name(actor.type_id, truncate)
 
 def get_actor_blueprints(world, filter, generation):
     bps = world.get_blueprint_library().filter(filter)
@@ -192,6 +182,15 @@ def get_actor_blueprints(world, filter, generation):
 
 
 class World(object):
+    __slots__ = (
+        'world', 'sync', 'actor_role_name', 'map', 'hud', 'aebs', 'player',
+        'collision_sensor', 'lane_invasion_sensor', 'gnss_sensor', 'imu_sensor',
+        'radar_sensor', 'camera_manager', 'player_max_speed', 'player_max_speed_fast',
+        'recording_enabled', 'recording_start', 'constant_velocity_enabled',
+        'show_vehicle_telemetry', 'doors_are_open', 'current_map_layer', 'map_layer_names',
+        '_weather_presets', '_weather_index', '_actor_filter', '_actor_generation',
+        '_gamma', '_blueprints', '_spawn_points')
+
     def __init__(self, carla_world, hud, args, aebs):
         self.world = carla_world
         self.sync = args.sync
@@ -217,6 +216,8 @@ class World(object):
         self._actor_filter = args.filter
         self._actor_generation = args.generation
         self._gamma = args.gamma
+        self._blueprints = None
+        self._spawn_points = None
         self.restart()
         self.world.on_tick(hud.on_world_tick)
         self.recording_enabled = False
@@ -245,14 +246,17 @@ class World(object):
         # Keep same camera config if the camera manager exists.
         cam_index = self.camera_manager.index if self.camera_manager is not None else 0
         cam_pos_index = self.camera_manager.transform_index if self.camera_manager is not None else 0
-        # Get a random blueprint.
-        blueprint = random.choice(get_actor_blueprints(self.world, self._actor_filter, self._actor_generation))
+        # Get a random blueprint. The filtered library does not change between
+        # restarts, so only query the server for it once.
+        if self._blueprints is None:
+            self._blueprints = get_actor_blueprints(self.world, self._actor_filter, self._actor_generation)
+        blueprint = choice(self._blueprints)
         blueprint.set_attribute('role_name', self.actor_role_name)
         if blueprint.has_attribute('color'):
-            color = random.choice(blueprint.get_attribute('color').recommended_values)
+            color = choice(blueprint.get_attribute('color').recommended_values)
             blueprint.set_attribute('color', color)
         if blueprint.has_attribute('driver_id'):
-            driver_id = random.choice(blueprint.get_attribute('driver_id').recommended_values)
+            driver_id = choice(blueprint.get_attribute('driver_id').recommended_values)
             blueprint.set_attribute('driver_id', driver_id)
         if blueprint.has_attribute('is_invincible'):
             blueprint.set_attribute('is_invincible', 'true')
@@ -272,12 +276,14 @@ class World(object):
             self.show_vehicle_telemetry = False
             self.modify_vehicle_physics(self.player)
         while self.player is None:
-            if not self.map.get_spawn_points():
+            if self._spawn_points is None:
+                self._spawn_points = self.map.get_spawn_points()
+            if not self._spawn_points:
                 print('There are no spawn points available in your map/town.')
                 print('Please add some Vehicle Spawn Point to your UE4 scene.')
                 sys.exit(1)
-            spawn_points = self.map.get_spawn_points()
-            spawn_point = random.choice(spawn_points) if spawn_points else carla.Transform()
+            spawn_points = self._spawn_points
+            spawn_point = choice(spawn_points) if spawn_points else carla.Transform()
             self.player = self.world.try_spawn_actor(blueprint, spawn_point)
             self.show_vehicle_telemetry = False
             self.modify_vehicle_physics(self.player)
@@ -371,11 +377,19 @@ class World(object):
 
 class KeyboardControl(object):
     """Class that handles keyboard input."""
+    __slots__ = (
+        '_autopilot_enabled', '_is_vehicle', '_control', '_lights', '_pending_lights',
+        '_rotation', '_steer_cache', '_keyup_handlers')
+
+    _NUMKEYS = frozenset(range(K_0 + 1, K_9 + 1))
+
     def __init__(self, world, start_in_autopilot):
         self._autopilot_enabled = start_in_autopilot
-        if isinstance(world.player, carla.Vehicle):
+        self._is_vehicle = isinstance(world.player, carla.Vehicle)
+        if self._is_vehicle:
             self._control = carla.VehicleControl()
             self._lights = carla.VehicleLightState.NONE
+            self._pending_lights = self._lights
             world.player.set_autopilot(self._autopilot_enabled)
             world.player.set_light_state(self._lights)
         elif isinstance(world.player, carla.Walker):
@@ -385,193 +399,217 @@ class KeyboardControl(object):
         else:
             raise NotImplementedError("Actor type not supported")
         self._steer_cache = 0.0
+        self._keyup_handlers = self._build_keyup_handlers(self._is_vehicle)
+        # Only QUIT and KEYUP are consumed, let SDL drop everything else at
+        # the source instead of queueing it.
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.QUIT, pygame.KEYUP])
         world.hud.notification("Press 'H' or '?' for help.", seconds=4.0)
 
+    def _build_keyup_handlers(self, is_vehicle):
+        """Build the (key, ctrl, shift) -> handler table used by parse_events."""
+        handlers = {}
+
+        def bind(key, handler, ctrl=None, shift=None):
+            # A modifier left as None matches both its pressed and released state.
+            for ctrl_state in ((False, True) if ctrl is None else (ctrl,)):
+                for shift_state in ((False, True) if shift is None else (shift,)):
+                    handlers[(key, ctrl_state, shift_state)] = handler
+
+        bind(K_u, lambda client, world, sync_mode: world.aebs.toggle_aebs())
+        bind(K_BACKSPACE, self._restart_world)
+        bind(K_F1, lambda client, world, sync_mode: world.hud.toggle_info())
+        bind(K_v, lambda client, world, sync_mode: world.next_map_layer(reverse=True), shift=True)
+        bind(K_v, lambda client, world, sync_mode: world.next_map_layer(), shift=False)
+        bind(K_b, lambda client, world, sync_mode: world.load_map_layer(unload=True), shift=True)
+        bind(K_b, lambda client, world, sync_mode: world.load_map_layer(), shift=False)
+        bind(K_h, lambda client, world, sync_mode: world.hud.help.toggle())
+        bind(K_SLASH, lambda client, world, sync_mode: world.hud.help.toggle(), shift=True)
+        bind(K_TAB, lambda client, world, sync_mode: world.camera_manager.toggle_camera())
+        bind(K_c, lambda client, world, sync_mode: world.next_weather(reverse=True), shift=True)
+        bind(K_c, lambda client, world, sync_mode: world.next_weather(), shift=False)
+        bind(K_g, lambda client, world, sync_mode: world.toggle_radar())
+        bind(K_BACKQUOTE, lambda client, world, sync_mode: world.camera_manager.next_sensor())
+        bind(K_n, lambda client, world, sync_mode: world.camera_manager.next_sensor())
+        bind(K_w, self._toggle_constant_velocity, ctrl=True)
+        bind(K_o, self._toggle_doors)
+        bind(K_t, self._toggle_telemetry)
+        bind(K_r, lambda client, world, sync_mode: world.camera_manager.toggle_recording(), ctrl=False)
+        bind(K_r, self._toggle_recorder, ctrl=True)
+        bind(K_p, self._replay_recording, ctrl=True)
+        bind(K_MINUS, lambda client, world, sync_mode: self._shift_recording_start(world, -10), ctrl=True, shift=True)
+        bind(K_MINUS, lambda client, world, sync_mode: self._shift_recording_start(world, -1), ctrl=True, shift=False)
+        bind(K_EQUALS, lambda client, world, sync_mode: self._shift_recording_start(world, 10), ctrl=True, shift=True)
+        bind(K_EQUALS, lambda client, world, sync_mode: self._shift_recording_start(world, 1), ctrl=True, shift=False)
+        if is_vehicle:
+            bind(K_q, self._toggle_reverse_gear, ctrl=False)
+            bind(K_m, self._toggle_manual_gear_shift)
+            bind(K_COMMA, self._gear_down)
+            bind(K_PERIOD, self._gear_up)
+            bind(K_p, self._toggle_autopilot, ctrl=False)
+            bind(K_l, lambda client, world, sync_mode: self._toggle_light(carla.VehicleLightState.Special1), ctrl=True)
+            bind(K_l, lambda client, world, sync_mode: self._toggle_light(carla.VehicleLightState.HighBeam), ctrl=False, shift=True)
+            bind(K_l, self._cycle_lights, ctrl=False, shift=False)
+            bind(K_i, lambda client, world, sync_mode: self._toggle_light(carla.VehicleLightState.Interior))
+            bind(K_z, lambda client, world, sync_mode: self._toggle_light(carla.VehicleLightState.LeftBlinker))
+            bind(K_x, lambda client, world, sync_mode: self._toggle_light(carla.VehicleLightState.RightBlinker))
+        return handlers
+
     def parse_events(self, client, world, clock, sync_mode):
-        if isinstance(self._control, carla.VehicleControl):
-            current_lights = self._lights
-        for event in pygame.event.get():
+        if self._is_vehicle:
+            self._pending_lights = self._lights
+        for event in pygame.event.get((pygame.QUIT, pygame.KEYUP)):
             if event.type == pygame.QUIT:
                 return True
             elif event.type == pygame.KEYUP:
-                if self._is_quit_shortcut(event.key):
+                mods = pygame.key.get_mods()
+                if self._is_quit_shortcut(event.key, mods):
                     return True
-                elif event.key == K_u:
-                    world.aebs.toggle_aebs()
-                elif event.key == K_BACKSPACE:
-                    if self._autopilot_enabled:
-                        world.player.set_autopilot(False)
-                        world.restart()
-                        world.player.set_autopilot(True)
-                    else:
-                        world.restart()
-                elif event.key == K_F1:
-                    world.hud.toggle_info()
-                elif event.key == K_v and pygame.key.get_mods() & KMOD_SHIFT:
-                    world.next_map_layer(reverse=True)
-                elif event.key == K_v:
-                    world.next_map_layer()
-                elif event.key == K_b and pygame.key.get_mods() & KMOD_SHIFT:
-                    world.load_map_layer(unload=True)
-                elif event.key == K_b:
-                    world.load_map_layer()
-                elif event.key == K_h or (event.key == K_SLASH and pygame.key.get_mods() & KMOD_SHIFT):
-                    world.hud.help.toggle()
-                elif event.key == K_TAB:
-                    world.camera_manager.toggle_camera()
-                elif event.key == K_c and pygame.key.get_mods() & KMOD_SHIFT:
-                    world.next_weather(reverse=True)
-                elif event.key == K_c:
-                    world.next_weather()
-                elif event.key == K_g:
-                    world.toggle_radar()
-                elif event.key == K_BACKQUOTE:
-                    world.camera_manager.next_sensor()
-                elif event.key == K_n:
-                    world.camera_manager.next_sensor()
-                elif event.key == K_w and (pygame.key.get_mods() & KMOD_CTRL):
-                    if world.constant_velocity_enabled:
-                        world.player.disable_constant_velocity()
-                        world.constant_velocity_enabled = False
-                        world.hud.notification("Disabled Constant Velocity Mode")
-                    else:
-                        world.player.enable_constant_velocity(carla.Vector3D(17, 0, 0))
-                        world.constant_velocity_enabled = True
-                        world.hud.notification("Enabled Constant Velocity Mode at 60 km/h")
-                elif event.key == K_o:
-                    try:
-                        if world.doors_are_open:
-                            world.hud.notification("Closing Doors")
-                            world.doors_are_open = False
-                            world.player.close_door(carla.VehicleDoor.All)
-                        else:
-                            world.hud.notification("Opening doors")
-                            world.doors_are_open = True
-                            world.player.open_door(carla.VehicleDoor.All)
-                    except Exception:
-                        pass
-                elif event.key == K_t:
-                    if world.show_vehicle_telemetry:
-                        world.player.show_debug_telemetry(False)
-                        world.show_vehicle_telemetry = False
-                        world.hud.notification("Disabled Vehicle Telemetry")
-                    else:
-                        try:
-                            world.player.show_debug_telemetry(True)
-                            world.show_vehicle_telemetry = True
-                            world.hud.notification("Enabled Vehicle Telemetry")
-                        except Exception:
-                            pass
-                elif event.key > K_0 and event.key <= K_9:
-                    index_ctrl = 0
-                    if pygame.key.get_mods() & KMOD_CTRL:
-                        index_ctrl = 9
-                    world.camera_manager.set_sensor(event.key - 1 - K_0 + index_ctrl)
-                elif event.key == K_r and not (pygame.key.get_mods() & KMOD_CTRL):
-                    world.camera_manager.toggle_recording()
-                elif event.key == K_r and (pygame.key.get_mods() & KMOD_CTRL):
-                    if (world.recording_enabled):
-                        client.stop_recorder()
-                        world.recording_enabled = False
-                        world.hud.notification("Recorder is OFF")
-                    else:
-                        client.start_recorder("manual_recording.rec")
-                        world.recording_enabled = True
-                        world.hud.notification("Recorder is ON")
-                elif event.key == K_p and (pygame.key.get_mods() & KMOD_CTRL):
-                    # stop recorder
-                    client.stop_recorder()
-                    world.recording_enabled = False
-                    # work around to fix camera at start of replaying
-                    current_index = world.camera_manager.index
-                    world.destroy_sensors()
-                    # disable autopilot
-                    self._autopilot_enabled = False
-                    world.player.set_autopilot(self._autopilot_enabled)
-                    world.hud.notification("Replaying file 'manual_recording.rec'")
-                    # replayer
-                    client.replay_file("manual_recording.rec", world.recording_start, 0, 0)
-                    world.camera_manager.set_sensor(current_index)
-                elif event.key == K_MINUS and (pygame.key.get_mods() & KMOD_CTRL):
-                    if pygame.key.get_mods() & KMOD_SHIFT:
-                        world.recording_start -= 10
-                    else:
-                        world.recording_start -= 1
-                    world.hud.notification("Recording start time is %d" % (world.recording_start))
-                elif event.key == K_EQUALS and (pygame.key.get_mods() & KMOD_CTRL):
-                    if pygame.key.get_mods() & KMOD_SHIFT:
-                        world.recording_start += 10
-                    else:
-                        world.recording_start += 1
-                    world.hud.notification("Recording start time is %d" % (world.recording_start))
-                if isinstance(self._control, carla.VehicleControl):
-                    if event.key == K_q:
-                        self._control.gear = 1 if self._control.reverse else -1
-                    elif event.key == K_m:
-                        self._control.manual_gear_shift = not self._control.manual_gear_shift
-                        self._control.gear = world.player.get_control().gear
-                        world.hud.notification('%s Transmission' %
-                                               ('Manual' if self._control.manual_gear_shift else 'Automatic'))
-                    elif self._control.manual_gear_shift and event.key == K_COMMA:
-                        self._control.gear = max(-1, self._control.gear - 1)
-                    elif self._control.manual_gear_shift and event.key == K_PERIOD:
-                        self._control.gear = self._control.gear + 1
-                    elif event.key == K_p and not pygame.key.get_mods() & KMOD_CTRL:
-                        if not self._autopilot_enabled and not sync_mode:
-                            print("WARNING: You are currently in asynchronous mode and could "
-                                  "experience some issues with the traffic simulation")
-                        self._autopilot_enabled = not self._autopilot_enabled
-                        world.player.set_autopilot(self._autopilot_enabled)
-                        world.hud.notification(
-                            'Autopilot %s' % ('On' if self._autopilot_enabled else 'Off'))
-                    elif event.key == K_l and pygame.key.get_mods() & KMOD_CTRL:
-                        current_lights ^= carla.VehicleLightState.Special1
-                    elif event.key == K_l and pygame.key.get_mods() & KMOD_SHIFT:
-                        current_lights ^= carla.VehicleLightState.HighBeam
-                    elif event.key == K_l:
-                        # Use 'L' key to switch between lights:
-                        # closed -> position -> low beam -> fog
-                        if not self._lights & carla.VehicleLightState.Position:
-                            world.hud.notification("Position lights")
-                            current_lights |= carla.VehicleLightState.Position
-                        else:
-                            world.hud.notification("Low beam lights")
-                            current_lights |= carla.VehicleLightState.LowBeam
-                        if self._lights & carla.VehicleLightState.LowBeam:
-                            world.hud.notification("Fog lights")
-                            current_lights |= carla.VehicleLightState.Fog
-                        if self._lights & carla.VehicleLightState.Fog:
-                            world.hud.notification("Lights off")
-                            current_lights ^= carla.VehicleLightState.Position
-                            current_lights ^= carla.VehicleLightState.LowBeam
-                            current_lights ^= carla.VehicleLightState.Fog
-                    elif event.key == K_i:
-                        current_lights ^= carla.VehicleLightState.Interior
-                    elif event.key == K_z:
-                        current_lights ^= carla.VehicleLightState.LeftBlinker
-                    elif event.key == K_x:
-                        current_lights ^= carla.VehicleLightState.RightBlinker
+                handler = self._keyup_handlers.get(
+                    (event.key, bool(mods & KMOD_CTRL), bool(mods & KMOD_SHIFT)))
+                if handler is not None:
+                    handler(client, world, sync_mode)
+                elif event.key in self._NUMKEYS:
+                    world.camera_manager.set_sensor(event.key - K_0 - 1 + (9 if mods & KMOD_CTRL else 0))
 
         if not self._autopilot_enabled:
-            if isinstance(self._control, carla.VehicleControl):
-                self._parse_vehicle_keys(pygame.key.get_pressed(), clock.get_time())
+            keys = pygame.key.get_pressed()
+            if self._is_vehicle:
+                self._parse_vehicle_keys(keys, clock.get_time())
                 self._control.reverse = self._control.gear < 0
-                # Set automatic control-related vehicle lights
-                if self._control.brake:
-                    current_lights |= carla.VehicleLightState.Brake
-                else: # Remove the Brake flag
-                    current_lights &= ~carla.VehicleLightState.Brake
-                if self._control.reverse:
-                    current_lights |= carla.VehicleLightState.Reverse
-                else: # Remove the Reverse flag
-                    current_lights &= ~carla.VehicleLightState.Reverse
+                # Set automatic control-related vehicle lights: clear the Brake
+                # and Reverse flags and set back the ones currently active.
+                mask = (carla.VehicleLightState.Brake if self._control.brake else 0) | \
+                    (carla.VehicleLightState.Reverse if self._control.reverse else 0)
+                current_lights = (self._pending_lights &
+                                  ~(carla.VehicleLightState.Brake | carla.VehicleLightState.Reverse)) | mask
                 if current_lights != self._lights: # Change the light state only if necessary
                     self._lights = current_lights
                     world.player.set_light_state(carla.VehicleLightState(self._lights))
-            elif isinstance(self._control, carla.WalkerControl):
-                self._parse_walker_keys(pygame.key.get_pressed(), clock.get_time(), world)
+            else:
+                self._parse_walker_keys(keys, pygame.key.get_mods(), clock.get_time(), world)
             world.player.apply_control(self._control)
 
+    def _restart_world(self, client, world, sync_mode):
+        if self._autopilot_enabled:
+            world.player.set_autopilot(False)
+            world.restart()
+            world.player.set_autopilot(True)
+        else:
+            world.restart()
+
+    def _toggle_constant_velocity(self, client, world, sync_mode):
+        if world.constant_velocity_enabled:
+            world.player.disable_constant_velocity()
+            world.constant_velocity_enabled = False
+            world.hud.notification("Disabled Constant Velocity Mode")
+        else:
+            world.player.enable_constant_velocity(carla.Vector3D(17, 0, 0))
+            world.constant_velocity_enabled = True
+            world.hud.notification("Enabled Constant Velocity Mode at 60 km/h")
+
+    def _toggle_doors(self, client, world, sync_mode):
+        try:
+            if world.doors_are_open:
+                world.hud.notification("Closing Doors")
+                world.doors_are_open = False
+                world.player.close_door(carla.VehicleDoor.All)
+            else:
+                world.hud.notification("Opening doors")
+                world.doors_are_open = True
+                world.player.open_door(carla.VehicleDoor.All)
+        except Exception:
+            pass
+
+    def _toggle_telemetry(self, client, world, sync_mode):
+        if world.show_vehicle_telemetry:
+            world.player.show_debug_telemetry(False)
+            world.show_vehicle_telemetry = False
+            world.hud.notification("Disabled Vehicle Telemetry")
+        else:
+            try:
+                world.player.show_debug_telemetry(True)
+                world.show_vehicle_telemetry = True
+                world.hud.notification("Enabled Vehicle Telemetry")
+            except Exception:
+                pass
+
+    def _toggle_recorder(self, client, world, sync_mode):
+        if (world.recording_enabled):
+            client.stop_recorder()
+            world.recording_enabled = False
+            world.hud.notification("Recorder is OFF")
+        else:
+            client.start_recorder("manual_recording.rec")
+            world.recording_enabled = True
+            world.hud.notification("Recorder is ON")
+
+    def _replay_recording(self, client, world, sync_mode):
+        # stop recorder
+        client.stop_recorder()
+        world.recording_enabled = False
+        # work around to fix camera at start of replaying
+        current_index = world.camera_manager.index
+        world.destroy_sensors()
+        # disable autopilot
+        self._autopilot_enabled = False
+        world.player.set_autopilot(self._autopilot_enabled)
+        world.hud.notification("Replaying file 'manual_recording.rec'")
+        # replayer
+        client.replay_file("manual_recording.rec", world.recording_start, 0, 0)
+        world.camera_manager.set_sensor(current_index)
+
+    def _shift_recording_start(self, world, seconds):
+        world.recording_start += seconds
+        world.hud.notification("Recording start time is %d" % (world.recording_start))
+
+    def _toggle_reverse_gear(self, client, world, sync_mode):
+        self._control.gear = 1 if self._control.reverse else -1
+
+    def _toggle_manual_gear_shift(self, client, world, sync_mode):
+        self._control.manual_gear_shift = not self._control.manual_gear_shift
+        self._control.gear = world.player.get_control().gear
+        world.hud.notification('%s Transmission' %
+                               ('Manual' if self._control.manual_gear_shift else 'Automatic'))
+
+    def _gear_down(self, client, world, sync_mode):
+        if self._control.manual_gear_shift:
+            self._control.gear = max(-1, self._control.gear - 1)
+
+    def _gear_up(self, client, world, sync_mode):
+        if self._control.manual_gear_shift:
+            self._control.gear = self._control.gear + 1
+
+    def _toggle_autopilot(self, client, world, sync_mode):
+        if not self._autopilot_enabled and not sync_mode:
+            print("WARNING: You are currently in asynchronous mode and could "
+                  "experience some issues with the traffic simulation")
+        self._autopilot_enabled = not self._autopilot_enabled
+        world.player.set_autopilot(self._autopilot_enabled)
+        world.hud.notification(
+            'Autopilot %s' % ('On' if self._autopilot_enabled else 'Off'))
+
+    def _toggle_light(self, light):
+        self._pending_lights ^= light
+
+    def _cycle_lights(self, client, world, sync_mode):
+        # Use 'L' key to switch between lights:
+        # closed -> position -> low beam -> fog
+        if not self._lights & carla.VehicleLightState.Position:
+            world.hud.notification("Position lights")
+            self._pending_lights |= carla.VehicleLightState.Position
+        else:
+            world.hud.notification("Low beam lights")
+            self._pending_lights |= carla.VehicleLightState.LowBeam
+        if self._lights & carla.VehicleLightState.LowBeam:
+            world.hud.notification("Fog lights")
+            self._pending_lights |= carla.VehicleLightState.Fog
+        if self._lights & carla.VehicleLightState.Fog:
+            world.hud.notification("Lights off")
+            self._pending_lights ^= carla.VehicleLightState.Position
+            self._pending_lights ^= carla.VehicleLightState.LowBeam
+            self._pending_lights ^= carla.VehicleLightState.Fog
+
     def _parse_vehicle_keys(self, keys, milliseconds):
         if keys[K_UP] or keys[K_w]:
             self._control.throttle = min(self._control.throttle + 0.01, 1.00)
@@ -597,10 +635,11 @@ class KeyboardControl(object):
         else:
             self._steer_cache = 0.0
         self._steer_cache = min(0.7, max(-0.7, self._steer_cache))
-        self._control.steer = round(self._steer_cache, 1)
+        # Snap to one decimal with the integer round() fast path.
+        self._control.steer = round(self._steer_cache * 10.0) / 10.0
         self._control.hand_brake = keys[K_SPACE]
 
-    def _parse_walker_keys(self, keys, milliseconds, world):
+    def _parse_walker_keys(self, keys, mods, milliseconds, world):
         self._control.speed = 0.0
         if keys[K_DOWN] or keys[K_s]:
             self._control.speed = 0.0
@@ -611,14 +650,14 @@ class KeyboardControl(object):
             self._control.speed = .01
             self._rotation.yaw += 0.08 * milliseconds
         if keys[K_UP] or keys[K_w]:
-            self._control.speed = world.player_max_speed_fast if pygame.key.get_mods() & KMOD_SHIFT else world.player_max_speed
+            self._control.speed = world.player_max_speed_fast if mods & KMOD_SHIFT else world.player_max_speed
         self._control.jump = keys[K_SPACE]
         self._rotation.yaw = round(self._rotation.yaw, 1)
         self._control.direction = self._rotation.get_forward_vector()
 
     @staticmethod
-    def _is_quit_shortcut(key):
-        return (key == K_ESCAPE) or (key == K_q and pygame.key.get_mods() & KMOD_CTRL)
+    def _is_quit_shortcut(key, mods):
+        return (key == K_ESCAPE) or (key == K_q and mods & KMOD_CTRL)
 
 
 # ==============================================================================
@@ -626,15 +665,26 @@ class KeyboardControl(object):
 # ==============================================================================
 
 
-class HUD(object):
-    def __init__(self, width, height):
-        self.dim = (width, height)
-        font = pygame.font.Font(pygame.font.get_default_font(), 20)
+_MONO_FONT_PATH = None
+
+
+def _find_mono_font():
+    # Scanning the system fonts is slow, only do it for the first HUD.
+    global _MONO_FONT_PATH
+    if _MONO_FONT_PATH is None:
         font_name = 'courier' if os.name == 'nt' else 'mono'
         fonts = [x for x in pygame.font.get_fonts() if font_name in x]
         default_font = 'ubuntumono'
         mono = default_font if default_font in fonts else fonts[0]
-        mono = pygame.font.match_font(mono)
+        _MONO_FONT_PATH = pygame.font.match_font(mono)
+    return _MONO_FONT_PATH
+
+
+class HUD(object):
+    def __init__(self, width, height):
+        self.dim = (width, height)
+        font = pygame.font.Font(pygame.font.get_default_font(), 20)
+        mono = _find_mono_font()
         self._font_mono = pygame.font.Font(mono, 12 if os.name == 'nt' else 14)
         self._notifications = FadingText(font, (width, 40), (0, height - 40))
         self.help = HelpText(pygame.font.Font(mono, 16), width, height)
@@ -643,7 +693,15 @@ class HUD(object):
         self.simulation_time = 0
         self._show_info = True
         self._info_text = []
+        # Rendered info lines keyed by their text, most lines repeat verbatim
+        # from one frame to the next.
+        self._text_cache = {}
+        self._info_surface = pygame.Surface((220, height))
+        self._info_surface.set_alpha(100)
         self._server_clock = pygame.time.Clock()
+        self._vehicles = None
+        self._vehicles_frame = 0
+        self._vehicles_player_id = None
         self.aebs = False
 
     def on_world_tick(self, timestamp):
@@ -668,23 +726,34 @@ class HUD(object):
         collision = [colhist[x + self.frame - 200] for x in range(0, 200)]
         max_col = max(1.0, max(collision))
         collision = [x / max_col for x in collision]
-        vehicles = world.world.get_actors().filter('vehicle.*')
+        # Listing the actors is a full round trip to the server and the set of
+        # vehicles rarely changes, so only refresh it every few server frames.
+        if (self._vehicles is None or world.player.id != self._vehicles_player_id or
+                abs(self.frame - self._vehicles_frame) >= 30):
+            self._vehicles = world.world.get_actors().filter('vehicle.*')
+            self._vehicles_frame = self.frame
+            self._vehicles_player_id = world.player.id
+        vehicles = self._vehicles
+        accel = world.imu_sensor.accelerometer
+        gyro = world.imu_sensor.gyroscope
+        location = f'({t.location.x: 5.1f}, {t.location.y: 5.1f})'
+        gnss = f'({world.gnss_sensor.lat: 2.6f}, {world.gnss_sensor.lon: 3.6f})'
         self._info_text = [
-            'Server:  % 16.0f FPS' % self.server_fps,
-            'Client:  % 16.0f FPS' % clock.get_fps(),
+            f'Server:  {self.server_fps: 16.0f} FPS',
+            f'Client:  {clock.get_fps(): 16.0f} FPS',
             '',
-            'Vehicle: % 20s' % get_actor_display_name(world.player, truncate=20),
-            'Map:     % 20s' % world.map.name.split('/')[-1],
-            'Simulation time: % 12s' % datetime.timedelta(seconds=int(self.simulation_time)),
+            f'Vehicle: {get_actor_display_name(world.player, truncate=20):>20}',
+            f"Map:     {world.map.name.split('/')[-1]:>20}",
+            f'Simulation time: {timedelta(seconds=int(self.simulation_time))!s:>12}',
             '',
-            'Speed:   % 15.0f km/h' % (3.6 * math.sqrt(v.x**2 + v.y**2 + v.z**2)),
-            u'Compass:% 17.0f\N{DEGREE SIGN} % 2s' % (compass, heading),
-            'Accelero: (%5.1f,%5.1f,%5.1f)' % (world.imu_sensor.accelerometer),
-            'Gyroscop: (%5.1f,%5.1f,%5.1f)' % (world.imu_sensor.gyroscope),
-            'Location:% 20s' % ('(% 5.1f, % 5.1f)' % (t.location.x, t.location.y)),
-            'GNSS:% 24s' % ('(% 2.6f, % 3.6f)' % (world.gnss_sensor.lat, world.gnss_sensor.lon)),
-            'Height:  % 18.0f m' % t.location.z,
-            'AEBS: %18.0f m' % self.aebs,
+            f'Speed:   {3.6 * hypot(v.x, v.y, v.z): 15.0f} km/h',
+            f'Compass:{compass: 17.0f}\N{DEGREE SIGN} {heading:>2}',
+            f'Accelero: ({accel[0]:5.1f},{accel[1]:5.1f},{accel[2]:5.1f})',
+            f'Gyroscop: ({gyro[0]:5.1f},{gyro[1]:5.1f},{gyro[2]:5.1f})',
+            f'Location:{location:>20}',
+            f'GNSS:{gnss:>24}',
+            f'Height:  {t.location.z: 18.0f} m',
+            f'AEBS: {self.aebs:18.0f} m',
             '']
         if isinstance(c, carla.VehicleControl):
             self._info_text += [
@@ -694,7 +763,7 @@ class HUD(object):
                 ('Reverse:', c.reverse),
                 ('Hand brake:', c.hand_brake),
                 ('Manual:', c.manual_gear_shift),
-                'Gear:        %s' % {-1: 'R', 0: 'N'}.get(c.gear, c.gear)]
+                f"Gear:        {({-1: 'R', 0: 'N'}.get(c.gear, c.gear))}"]
         elif isinstance(c, carla.WalkerControl):
             self._info_text += [
                 ('Speed:', c.speed, 0.0, 5.556),
@@ -704,16 +773,17 @@ class HUD(object):
             'Collision:',
             collision,
             '',
-            'Number of vehicles: % 8d' % len(vehicles)]
+            f'Number of vehicles: {len(vehicles): 8d}']
         if len(vehicles) > 1:
             self._info_text += ['Nearby vehicles:']
-            distance = lambda l: math.sqrt((l.x - t.location.x)**2 + (l.y - t.location.y)**2 + (l.z - t.location.z)**2)
-            vehicles = [(distance(x.get_location()), x) for x in vehicles if x.id != world.player.id]
-            for d, vehicle in sorted(vehicles, key=lambda vehicles: vehicles[0]):
-                if d > 200.0:
-                    break
-                vehicle_type = get_actor_display_name(vehicle, truncate=22)
-                self._info_text.append('% 4dm %s' % (d, vehicle_type))
+            vehicles = [x for x in vehicles if x.id != world.player.id]
+            locations = np.array(
+                [(l.x, l.y, l.z) for l in (x.get_location() for x in vehicles)], dtype=np.float64).reshape(-1, 3)
+            distances = np.linalg.norm(locations - (t.location.x, t.location.y, t.location.z), axis=1)
+            nearby = np.flatnonzero(distances <= 200.0)
+            for i in nearby[np.argsort(distances[nearby])]:
+                vehicle_type = get_actor_display_name(vehicles[i], truncate=22)
+                self._info_text.append(f'{int(distances[i]): 4d}m {vehicle_type}')
 
     def toggle_info(self):
         self._show_info = not self._show_info
@@ -726,9 +796,7 @@ class HUD(object):
 
     def render(self, display):
         if self._show_info:
-            info_surface = pygame.Surface((220, self.dim[1]))
-            info_surface.set_alpha(100)
-            display.blit(info_surface, (0, 0))
+            display.blit(self._info_surface, (0, 0))
             v_offset = 4
             bar_h_offset = 100
             bar_width = 106
@@ -756,7 +824,12 @@ class HUD(object):
                         pygame.draw.rect(display, (255, 255, 255), rect)
                     item = item[0]
                 if item:  # At this point has to be a str.
-                    surface = self._font_mono.render(item, True, (255, 255, 255))
+                    surface = self._text_cache.get(item)
+                    if surface is None:
+                        if len(self._text_cache) >= 256:
+                            self._text_cache.clear()
+                        surface = self._font_mono.render(item, True, (255, 255, 255))
+                        self._text_cache[item] = surface
                     display.blit(surface, (8, v_offset))
                 v_offset += 18
         self._notifications.render(display)
@@ -778,7 +851,6 @@ class FadingText(object):
 
     def set_text(self, text, color=(255, 255, 255), seconds=2.0):
         text_texture = self.font.render(text, True, color)
-        self.surface = pygame.Surface(self.dim)
         self.seconds_left = seconds
         self.surface.fill((0, 0, 0, 0))
         self.surface.blit(text_texture, (10, 11))
@@ -806,12 +878,13 @@ class HelpText(object):
         self.dim = (780, len(lines) * self.line_space + 12)
         self.pos = (0.5 * width - 0.5 * self.dim[0], 0.5 * height - 0.5 * self.dim[1])
         self.seconds_left = 0
+        self._render = False
         self.surface = pygame.Surface(self.dim)
         self.surface.fill((0, 0, 0, 0))
+        render, blit, color = self.font.render, self.surface.blit, (255, 255, 255)
         for n, line in enumerate(lines):
-            text_texture = self.font.render(line, True, (255, 255, 255))
-            self.surface.blit(text_texture, (22, n * self.line_space))
-            self._render = False
+            if line:
+                blit(render(line, True, color), (22, n * self.line_space))
         self.surface.set_alpha(220)
 
     def toggle(self):
@@ -832,16 +905,33 @@ class AEBS(object):
         pygame.init()
         self.mixer = pygame.mixer
         self.mixer.init()
+        # Warning sounds play on a dedicated channel and are decoded only once.
+        self.mixer.set_reserved(1)
+        self._channel = self.mixer.Channel(0)
+        self._sounds = {}
         self.warning_image = pygame.image.load("warning-sign.jpg")
         self.failure_warning_image = pygame.image.load("failure-warning-sign.png")
+        # Match the display pixel format once so blitting does not convert
+        # the images every time; this needs a video mode to be set already.
+        try:
+            self.warning_image = self.warning_image.convert()
+            self.failure_warning_image = self.failure_warning_image.convert_alpha()
+        except pygame.error:
+            pass
 
 
+    def _play_sound(self, filename):
+        sound = self._sounds.get(filename)
+        if sound is None:
+            sound = self.mixer.Sound(filename)
+            sound.set_volume(0.2)
+            self._sounds[filename] = sound
+        self._channel.play(sound)
+
     def toggle_aebs(self):
         self.active = not self.active
         print("toggled aebs")
-        self.mixer.music.set_volume(0.2)
-        self.mixer.music.load("test.mp3")
-        self.mixer.music.play()
+        self._play_sound("test.mp3")
         self.test_aebs()
 
     def test_aebs(self):
@@ -881,49 +971,49 @@ class AEBS(object):
 
     def system_failure_warning(self):
         print("WARNING: AEBS system has failed. Please check for errors and restart the system.")
-        self.mixer.music.set_volume(0.2)
-        self.mixer.music.load("warn.mp3")
-        self.mixer.music.play()
+        self._play_sound("warn.mp3")
         screen = pygame.display.set_mode((300, 300))
         screen.blit(self.failure_warning_image, (0, 0))
         pygame.display.flip()
+        pygame.event.set_allowed(pygame.KEYDOWN)
         # Wait for error to be fixed
         while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
+            # Block until the next event instead of spinning on the queue.
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    pygame.quit()
+                    return
+                else:
+                    # Error fixed, hide warning image
                     pygame.quit()
                     return
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        pygame.quit()
-                        return
-                    else:
-                        # Error fixed, hide warning image
-                        pygame.quit()
-                        return
 
     def collision_warning(self):
         print("WARNING: Collision detected. Please take immediate action to avoid impact.")
-        self.mixer.music.set_volume(0.2)
-        self.mixer.music.load("collision.mp3")
-        self.mixer.music.play()
+        self._play_sound("collision.mp3")
         screen = pygame.display.set_mode((300, 300))
         screen.blit(self.warning_image, (0, 0))
         pygame.display.flip()
+        pygame.event.set_allowed(pygame.KEYDOWN)
         # Wait for warning to be acknowledged
         while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
+            # Block until the next event instead of spinning on the queue.
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    pygame.quit()
+                    return
+                else:
+                    # Warning acknowledged, hide warning image
                     pygame.quit()
                     return
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        pygame.quit()
-                        return
-                    else:
-                        # Warning acknowledged, hide warning image
-                        pygame.quit()
-                        return
 
 
 # ==============================================================================
@@ -934,19 +1024,19 @@ class AEBS(object):
 class CollisionSensor(object):
     def __init__(self, parent_actor, hud):
         self.sensor = None
-        self.history = []
+        self.history = deque(maxlen=4000)
         self._parent = parent_actor
         self.hud = hud
         world = self._parent.get_world()
         bp = world.get_blueprint_library().find('sensor.other.collision')
         self.sensor = world.spawn_actor(bp, carla.Transform(), attach_to=self._parent)
-        # We need to pass the lambda a weak reference to self to avoid circular
+        # We need to pass the callback a weak reference to self to avoid circular
         # reference.
-        weak_self = weakref.ref(self)
-        self.sensor.listen(lambda event: CollisionSensor._on_collision(weak_self, event))
+        weak_self = weakref(self)
+        self.sensor.listen(partial(CollisionSensor._on_collision, weak_self))
 
     def get_collision_history(self):
-        history = collections.defaultdict(int)
+        history = defaultdict(int)
         for frame, intensity in self.history:
             history[frame] += intensity
         return history
@@ -959,10 +1049,8 @@ class CollisionSensor(object):
         actor_type = get_actor_display_name(event.other_actor)
         self.hud.notification('Collision with %r' % actor_type)
         impulse = event.normal_impulse
-        intensity = math.sqrt(impulse.x**2 + impulse.y**2 + impulse.z**2)
+        intensity = hypot(impulse.x, impulse.y, impulse.z)
         self.history.append((event.frame, intensity))
-        if len(self.history) > 4000:
-            self.history.pop(0)
 
 
 # ==============================================================================
@@ -981,10 +1069,10 @@ class LaneInvasionSensor(object):
             world = self._parent.get_world()
             bp = world.get_blueprint_library().find('sensor.other.lane_invasion')
             self.sensor = world.spawn_actor(bp, carla.Transform(), attach_to=self._parent)
-            # We need to pass the lambda a weak reference to self to avoid circular
+            # We need to pass the callback a weak reference to self to avoid circular
             # reference.
-            weak_self = weakref.ref(self)
-            self.sensor.listen(lambda event: LaneInvasionSensor._on_invasion(weak_self, event))
+            weak_self = weakref(self)
+            self.sensor.listen(partial(LaneInvasionSensor._on_invasion, weak_self))
 
     @staticmethod
     def _on_invasion(weak_self, event):
@@ -1010,10 +1098,10 @@ class GnssSensor(object):
         world = self._parent.get_world()
         bp = world.get_blueprint_library().find('sensor.other.gnss')
         self.sensor = world.spawn_actor(bp, carla.Transform(carla.Location(x=1.0, z=2.8)), attach_to=self._parent)
-        # We need to pass the lambda a weak reference to self to avoid circular
+        # We need to pass the callback a weak reference to self to avoid circular
         # reference.
-        weak_self = weakref.ref(self)
-        self.sensor.listen(lambda event: GnssSensor._on_gnss_event(weak_self, event))
+        weak_self = weakref(self)
+        self.sensor.listen(partial(GnssSensor._on_gnss_event, weak_self))
 
     @staticmethod
     def _on_gnss_event(weak_self, event):
@@ -1040,11 +1128,10 @@ class IMUSensor(object):
         bp = world.get_blueprint_library().find('sensor.other.imu')
         self.sensor = world.spawn_actor(
             bp, carla.Transform(), attach_to=self._parent)
-        # We need to pass the lambda a weak reference to self to avoid circular
+        # We need to pass the callback a weak reference to self to avoid circular
         # reference.
-        weak_self = weakref.ref(self)
-        self.sensor.listen(
-            lambda sensor_data: IMUSensor._IMU_callback(weak_self, sensor_data))
+        weak_self = weakref(self)
+        self.sensor.listen(partial(IMUSensor._IMU_callback, weak_self))
 
     @staticmethod
     def _IMU_callback(weak_self, sensor_data):
@@ -1057,10 +1144,10 @@ class IMUSensor(object):
             max(limits[0], min(limits[1], sensor_data.accelerometer.y)),
             max(limits[0], min(limits[1], sensor_data.accelerometer.z)))
         self.gyroscope = (
-            max(limits[0], min(limits[1], math.degrees(sensor_data.gyroscope.x))),
-            max(limits[0], min(limits[1], math.degrees(sensor_data.gyroscope.y))),
-            max(limits[0], min(limits[1], math.degrees(sensor_data.gyroscope.z))))
-        self.compass = math.degrees(sensor_data.compass)
+            max(limits[0], min(limits[1], degrees(sensor_data.gyroscope.x))),
+            max(limits[0], min(limits[1], degrees(sensor_data.gyroscope.y))),
+            max(limits[0], min(limits[1], degrees(sensor_data.gyroscope.z))))
+        self.compass = degrees(sensor_data.compass)
 
 
 # ==============================================================================
@@ -1089,9 +1176,8 @@ class RadarSensor(object):
                 carla.Rotation(pitch=5)),
             attach_to=self._parent)
         # We need a weak reference to self to avoid circular reference.
-        weak_self = weakref.ref(self)
-        self.sensor.listen(
-            lambda radar_data: RadarSensor._Radar_callback(weak_self, radar_data))
+        weak_self = weakref(self)
+        self.sensor.listen(partial(RadarSensor._Radar_callback, weak_self))
 
     @staticmethod
     def _Radar_callback(weak_self, radar_data):
@@ -1104,8 +1190,8 @@ class RadarSensor(object):
 
         current_rot = radar_data.transform.rotation
         for detect in radar_data:
-            azi = math.degrees(detect.azimuth)
-            alt = math.degrees(detect.altitude)
+            azi = degrees(detect.azimuth)
+            alt = degrees(detect.altitude)
             # The 0.25 adjusts a bit the distance so the dots can
             # be properly seen
             fw_vec = carla.Vector3D(x=detect.depth - 0.25)
@@ -1135,6 +1221,33 @@ class RadarSensor(object):
 # ==============================================================================
 
 
+# Blueprint id, ColorConverter name, description and blueprint attributes of
+# every view CameraManager can switch between.
+_SENSOR_DEFS = (
+    ('sensor.camera.rgb', 'Raw', 'Camera RGB', {}),
+    ('sensor.camera.depth', 'Raw', 'Camera Depth (Raw)', {}),
+    ('sensor.camera.depth', 'Depth', 'Camera Depth (Gray Scale)', {}),
+    ('sensor.camera.depth', 'LogarithmicDepth', 'Camera Depth (Logarithmic Gray Scale)', {}),
+    ('sensor.camera.semantic_segmentation', 'Raw', 'Camera Semantic Segmentation (Raw)', {}),
+    ('sensor.camera.semantic_segmentation', 'CityScapesPalette', 'Camera Semantic Segmentation (CityScapes Palette)', {}),
+    ('sensor.camera.instance_segmentation', 'CityScapesPalette', 'Camera Instance Segmentation (CityScapes Palette)', {}),
+    ('sensor.camera.instance_segmentation', 'Raw', 'Camera Instance Segmentation (Raw)', {}),
+    ('sensor.lidar.ray_cast', None, 'Lidar (Ray-Cast)', {'range': '50'}),
+    ('sensor.camera.dvs', 'Raw', 'Dynamic Vision Sensor', {}),
+    ('sensor.camera.rgb', 'Raw', 'Camera RGB Distorted',
+        {'lens_circle_multiplier': '3.0',
+        'lens_circle_falloff': '3.0',
+        'chromatic_aberration_intensity': '0.5',
+        'chromatic_aberration_offset': '0'}),
+    ('sensor.camera.optical_flow', 'Raw', 'Optical Flow', {}),
+)
+
+
+# Layout of a single event in carla.DVSEventArray.raw_data, built by
+# _lazy_imports once numpy is available.
+_DVS_EVENT_DTYPE = None
+
+
 class CameraManager(object):
     def __init__(self, parent_actor, hud, gamma_correction):
         self.sensor = None
@@ -1142,6 +1255,14 @@ class CameraManager(object):
         self._parent = parent_actor
         self.hud = hud
         self.recording = False
+        # Sensor frames are blitted into two preallocated surfaces in turn,
+        # so render() never reads the surface that is currently written to.
+        self._frame_surfaces = [pygame.Surface(hud.dim), pygame.Surface(hud.dim)]
+        self._frame_index = 0
+        # Scratch images for the lidar and DVS views, allocated on first use
+        # and cleared for every frame afterwards.
+        self._lidar_img = None
+        self._dvs_img = None
         bound_x = 0.5 + self._parent.bounding_box.extent.x
         bound_y = 0.5 + self._parent.bounding_box.extent.y
         bound_z = 0.5 + self._parent.bounding_box.extent.z
@@ -1164,23 +1285,8 @@ class CameraManager(object):
 
         self.transform_index = 1
         self.sensors = [
-            ['sensor.camera.rgb', cc.Raw, 'Camera RGB', {}],
-            ['sensor.camera.depth', cc.Raw, 'Camera Depth (Raw)', {}],
-            ['sensor.camera.depth', cc.Depth, 'Camera Depth (Gray Scale)', {}],
-            ['sensor.camera.depth', cc.LogarithmicDepth, 'Camera Depth (Logarithmic Gray Scale)', {}],
-            ['sensor.camera.semantic_segmentation', cc.Raw, 'Camera Semantic Segmentation (Raw)', {}],
-            ['sensor.camera.semantic_segmentation', cc.CityScapesPalette, 'Camera Semantic Segmentation (CityScapes Palette)', {}],
-            ['sensor.camera.instance_segmentation', cc.CityScapesPalette, 'Camera Instance Segmentation (CityScapes Palette)', {}],
-            ['sensor.camera.instance_segmentation', cc.Raw, 'Camera Instance Segmentation (Raw)', {}],
-            ['sensor.lidar.ray_cast', None, 'Lidar (Ray-Cast)', {'range': '50'}],
-            ['sensor.camera.dvs', cc.Raw, 'Dynamic Vision Sensor', {}],
-            ['sensor.camera.rgb', cc.Raw, 'Camera RGB Distorted',
-                {'lens_circle_multiplier': '3.0',
-                'lens_circle_falloff': '3.0',
-                'chromatic_aberration_intensity': '0.5',
-                'chromatic_aberration_offset': '0'}],
-            ['sensor.camera.optical_flow', cc.Raw, 'Optical Flow', {}],
-        ]
+            [sensor_id, getattr(cc, converter) if converter else None, description, attributes]
+            for sensor_id, converter, description, attributes in _SENSOR_DEFS]
         world = self._parent.get_world()
         bp_library = world.get_blueprint_library()
         for item in self.sensors:
@@ -1220,10 +1326,10 @@ class CameraManager(object):
                 self._camera_transforms[self.transform_index][0],
                 attach_to=self._parent,
                 attachment_type=self._camera_transforms[self.transform_index][1])
-            # We need to pass the lambda a weak reference to self to avoid
+            # We need to pass the callback a weak reference to self to avoid
             # circular reference.
-            weak_self = weakref.ref(self)
-            self.sensor.listen(lambda image: CameraManager._parse_image(weak_self, image))
+            weak_self = weakref(self)
+            self.sensor.listen(partial(CameraManager._parse_image, weak_self))
         if notify:
             self.hud.notification(self.sensors[index][2])
         self.index = index
@@ -1239,47 +1345,66 @@ class CameraManager(object):
         if self.surface is not None:
             display.blit(self.surface, (0, 0))
 
+    def _publish_frame(self, array):
+        surface = self._frame_surfaces[self._frame_index]
+        pygame.surfarray.blit_array(surface, array)
+        self._frame_index ^= 1
+        self.surface = surface
+
     @staticmethod
     def _parse_image(weak_self, image):
         self = weak_self()
         if not self:
             return
         if self.sensors[self.index][0].startswith('sensor.lidar'):
-            points = np.frombuffer(image.raw_data, dtype=np.dtype('f4'))
-            points = np.reshape(points, (int(points.shape[0] / 4), 4))
-            lidar_data = np.array(points[:, :2])
-            lidar_data *= min(self.hud.dim) / (2.0 * self.lidar_range)
+            points = np.frombuffer(image.raw_data, dtype=np.dtype('f4')).reshape(-1, 4)
+            scale = min(self.hud.dim) / (2.0 * self.lidar_range)
+            lidar_data = points[:, :2] * scale
             lidar_data += (0.5 * self.hud.dim[0], 0.5 * self.hud.dim[1])
-            lidar_data = np.fabs(lidar_data)  # pylint: disable=E1111
+            np.fabs(lidar_data, out=lidar_data)
             lidar_data = lidar_data.astype(np.int32)
-            lidar_data = np.reshape(lidar_data, (-1, 2))
-            lidar_img_size = (self.hud.dim[0], self.hud.dim[1], 3)
-            lidar_img = np.zeros((lidar_img_size), dtype=np.uint8)
-            lidar_img[tuple(lidar_data.T)] = (255, 255, 255)
-            self.surface = pygame.surfarray.make_surface(lidar_img)
+            # Drop the few points that land outside of the image instead of
+            # failing on an out of bounds index.
+            inside = (lidar_data[:, 0] < self.hud.dim[0]) & (lidar_data[:, 1] < self.hud.dim[1])
+            if self._lidar_img is None:
+                self._lidar_img = np.zeros((self.hud.dim[0], self.hud.dim[1], 3), dtype=np.uint8)
+            else:
+                self._lidar_img.fill(0)
+            lidar_img = self._lidar_img
+            lidar_img[lidar_data[inside, 0], lidar_data[inside, 1]] = 255
+            self._publish_frame(lidar_img)
         elif self.sensors[self.index][0].startswith('sensor.camera.dvs'):
             # Example of converting the raw_data from a carla.DVSEventArray
             # sensor into a NumPy array and using it as an image
-            dvs_events = np.frombuffer(image.raw_data, dtype=np.dtype([
-                ('x', np.uint16), ('y', np.uint16), ('t', np.int64), ('pol', np.bool)]))
-            dvs_img = np.zeros((image.height, image.width, 3), dtype=np.uint8)
+            dvs_events = np.frombuffer(image.raw_data, dtype=_DVS_EVENT_DTYPE)
+            if self._dvs_img is None:
+                self._dvs_img = np.zeros((image.height, image.width, 3), dtype=np.uint8)
+            else:
+                self._dvs_img.fill(0)
+            dvs_img = self._dvs_img
             # Blue is positive, red is negative
-            dvs_img[dvs_events[:]['y'], dvs_events[:]['x'], dvs_events[:]['pol'] * 2] = 255
-            self.surface = pygame.surfarray.make_surface(dvs_img.swapaxes(0, 1))
+            pol = dvs_events['pol']
+            dvs_img[..., 2][dvs_events['y'][pol], dvs_events['x'][pol]] = 255
+            pol = ~pol
+            dvs_img[..., 0][dvs_events['y'][pol], dvs_events['x'][pol]] = 255
+            self._publish_frame(dvs_img.swapaxes(0, 1))
         elif self.sensors[self.index][0].startswith('sensor.camera.optical_flow'):
             image = image.get_color_coded_flow()
             array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
             array = np.reshape(array, (image.height, image.width, 4))
             array = array[:, :, :3]
             array = array[:, :, ::-1]
-            self.surface = pygame.surfarray.make_surface(array.swapaxes(0, 1))
+            self._publish_frame(array.swapaxes(0, 1))
         else:
-            image.convert(self.sensors[self.index][1])
+            # Raw images are already in their final layout, only run CARLA's
+            # in-place conversion when a palette or depth mapping is needed.
+            if self.sensors[self.index][1] != cc.Raw:
+                image.convert(self.sensors[self.index][1])
             array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
             array = np.reshape(array, (image.height, image.width, 4))
             array = array[:, :, :3]
             array = array[:, :, ::-1]
-            self.surface = pygame.surfarray.make_surface(array.swapaxes(0, 1))
+            self._publish_frame(array.swapaxes(0, 1))
         if self.recording:
             image.save_to_disk('_out/%08d' % image.frame)
 
@@ -1290,6 +1415,7 @@ class CameraManager(object):
 
 
 def game_loop(args):
+    _lazy_imports()
     pygame.init()
     pygame.font.init()
     world = None
@@ -1362,7 +1488,18 @@ def game_loop(args):
 # ==============================================================================
 
 
-def main():
+_RES_RE = re.compile(r'^(\d+)x(\d+)$')
+
+
+def parse_resolution(text):
+    match = _RES_RE.match(text)
+    if match is None:
+        raise argparse.ArgumentTypeError('invalid resolution %r, expected WIDTHxHEIGHT' % text)
+    return int(match.group(1)), int(match.group(2))
+
+
+@lru_cache(maxsize=1)
+def _build_parser():
     argparser = argparse.ArgumentParser(
         description='CARLA Manual Control Client')
     argparser.add_argument(
@@ -1389,6 +1526,7 @@ def main():
         '--res',
         metavar='WIDTHxHEIGHT',
         default='1792x1008',
+        type=parse_resolution,
         help='window resolution (default: 1280x720)')
     argparser.add_argument(
         '--filter',
@@ -1414,9 +1552,13 @@ def main():
         '--sync',
         action='store_true',
         help='Activate synchronous mode execution')
-    args = argparser.parse_args()
+    return argparser
+
+
+def main():
+    args = _build_parser().parse_args()
 
-    args.width, args.height = [int(x) for x in args.res.split('x')]
+    args.width, args.height = args.res
 
     log_level = logging.DEBUG if args.debug else logging.INFO
     logging.basicConfig(format='%(levelname)s: %(message)s', level=log_level)